@@ -1,136 +1,455 @@
 # -*- coding: utf-8 -*-
 import streamlit as st
 import folium
-from streamlit_folium import st_folium
 import geopandas as gpd
-import sqlite3
+import glob
+import json
+import os
+import numpy as np
+import orjson
 import pandas as pd
-import plotly.express as px
-from xml.etree import ElementTree as ET
-
-# Configuração da página
-st.set_page_config(
-    page_title="APCAC - Cerrado",
-    page_icon="🌳",
-    layout="wide",
-    initial_sidebar_state="expanded"
-)
-
-# Título principal
-st.title("🌳 Áreas Prioritárias para Conservação de Águas do Cerrado")
-st.markdown("---")
-
-@st.cache_data
+import pyarrow as pa
+import plotly.graph_objects as go
+import pyogrio
+import shapely
+import tempfile
+from plotly.subplots import make_subplots
+from string import Template
+
+try:
+    # Parser em C do lxml, quando instalado
+    from lxml import etree as ET
+except ImportError:
+    from xml.etree import ElementTree as ET
+
+# Fontes originais dos dados APCAC
+GPKG_PATH = "data/apcac/apcac.gpkg"
+STATS_CSV_PATH = "data/apcac/apcac.csv"
+
+# Conversões colunares geradas pelo prebuild.py (preferidas quando existem)
+STATS_PARQUET_PATH = "data/apcac/apcac.parquet"
+
+# Simbologia QGIS das classes APCAC
+QML_PATH = "data/apcac/apcac.qml"
+
+# Campos exibidos no popup das feições
+APCAC_COL = 'cd_apcac'
+POPUP_FIELDS = [APCAC_COL, 'nuareacont', 't', 'slope']
+POPUP_ALIASES = ['APCAC:', 'Área (km²)', 'Elevação média (m)', 'Declividade média (%)']
+
+# Colunas da tabela de estatísticas usadas nos gráficos, com tipos fixos (sem inferência)
+STATS_DTYPES = {
+    APCAC_COL: 'string[pyarrow]',
+    'bio_area_km2': 'double[pyarrow]',
+    'bio_area_km2_p': 'double[pyarrow]',
+    'zhi_area_km2': 'double[pyarrow]',
+    'zhi_area_km2_p': 'double[pyarrow]'
+}
+
+# Mapas base (nome, URL dos tiles, atribuição)
+BASEMAPS = [
+    ('National Geographic',
+     'https://server.arcgisonline.com/ArcGIS/rest/services/NatGeo_World_Map/MapServer/tile/{z}/{y}/{x}',
+     'Esri National Geographic'),
+    ('Street Map',
+     'https://server.arcgisonline.com/ArcGIS/rest/services/World_Street_Map/MapServer/tile/{z}/{y}/{x}',
+     'Esri Standard'),
+]
+
+# Tiles vetoriais e FlatGeobuf gerados pelo prebuild.py, servidos pelo Streamlit em /app/static
+TILES_DIR = "static/tiles"
+FGB_DIR = "static/fgb"
+
+# Projeção métrica do Brasil (SIRGAS 2000 / policônica), usada na simplificação e no cálculo de áreas
+METRIC_CRS = 'EPSG:5880'
+
+# Camadas pré-simplificadas pelo prebuild.py, uma por tolerância (metros)
+SIMPLIFIED_DIR = "data/apcac/simplified"
+SIMPLIFY_TOLERANCES = (1000, 300, 100)
+
+# FlatGeobuf em vários níveis de detalhe: (zoom mínimo, tolerância), do mais grosseiro ao mais fino
+FGB_LEVELS = ((0, 1000), (6, 300), (8, 100))
+
+# Resumo por camada (polígonos, classes, área) pré-computado pelo prebuild.py
+LAYER_META_PATH = "data/apcac/layer_meta.parquet"
+
+MAPLIBRE_TEMPLATE = Template("""<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8">
+<link rel="stylesheet" href="https://unpkg.com/maplibre-gl@4.7.1/dist/maplibre-gl.css">
+<script src="https://unpkg.com/maplibre-gl@4.7.1/dist/maplibre-gl.js"></script>
+<script src="$library_url"></script>
+<style>
+html, body, #map { margin: 0; width: 100%; height: 100%; }
+#basemaps { position: absolute; top: 10px; right: 10px; padding: 6px 8px; background: #fff;
+            border-radius: 4px; box-shadow: 0 0 0 2px rgba(0, 0, 0, 0.1); font: 12px sans-serif; }
+#basemaps label { display: block; cursor: pointer; }
+</style>
+</head>
+<body>
+<div id="map"></div>
+<div id="basemaps"></div>
+<script>
+var basemaps = $basemaps;
+var popupFields = $popup_fields;
+var popupAliases = $popup_aliases;
+var dataUrl = new URL($data_url, document.baseURI).href;
+
+// Define apcacSource, apcacSourceLayer e onMapCreated(map) conforme o formato dos dados
+$source_script
+
+var sources = {apcac: apcacSource};
+var layers = [];
+basemaps.forEach(function (basemap, i) {
+    sources['basemap' + i] = {type: 'raster', tiles: [basemap[1]], tileSize: 256, attribution: basemap[2]};
+    layers.push({id: 'basemap' + i, type: 'raster', source: 'basemap' + i,
+                 layout: {visibility: i === 0 ? 'visible' : 'none'}});
+});
+[
+    {id: 'apcac-fill', type: 'fill', source: 'apcac',
+     paint: {'fill-color': $fill_color, 'fill-opacity': 0.6}},
+    {id: 'apcac-line', type: 'line', source: 'apcac',
+     paint: {'line-color': '#333333', 'line-width': 0.3, 'line-opacity': 0.8}}
+].forEach(function (layer) {
+    if (apcacSourceLayer) {
+        layer['source-layer'] = apcacSourceLayer;
+    }
+    layers.push(layer);
+});
+
+var map = new maplibregl.Map({container: 'map', style: {version: 8, sources: sources, layers: layers}});
+map.addControl(new maplibregl.NavigationControl(), 'top-left');
+onMapCreated(map);
+
+// Seletor de mapa base (equivalente ao LayerControl do Folium)
+var control = document.getElementById('basemaps');
+basemaps.forEach(function (basemap, i) {
+    var label = document.createElement('label');
+    var input = document.createElement('input');
+    input.type = 'radio';
+    input.name = 'basemap';
+    input.checked = i === 0;
+    input.onchange = function () {
+        basemaps.forEach(function (_, j) {
+            map.setLayoutProperty('basemap' + j, 'visibility', j === i ? 'visible' : 'none');
+        });
+    };
+    label.appendChild(input);
+    label.appendChild(document.createTextNode(' ' + basemap[0]));
+    control.appendChild(label);
+});
+
+// Popup com os atributos lidos diretamente da feição
+map.on('click', 'apcac-fill', function (e) {
+    var props = e.features[0].properties;
+    var rows = popupFields.map(function (field, i) {
+        var value = props[field] === undefined ? '' : props[field];
+        return '<tr><th style="text-align: left; padding-right: 6px;">' + popupAliases[i] + '</th><td>' + value + '</td></tr>';
+    });
+    new maplibregl.Popup().setLngLat(e.lngLat).setHTML('<table>' + rows.join('') + '</table>').addTo(map);
+});
+
+// Dica com o código APCAC ao passar o mouse (equivalente ao GeoJsonTooltip do Folium)
+var tooltip = new maplibregl.Popup({closeButton: false, closeOnClick: false});
+map.on('mousemove', 'apcac-fill', function (e) {
+    map.getCanvas().style.cursor = 'pointer';
+    var code = e.features[0].properties[popupFields[0]];
+    tooltip.setLngLat(e.lngLat).setText(popupAliases[0] + ' ' + (code === undefined ? '' : code)).addTo(map);
+});
+map.on('mouseleave', 'apcac-fill', function () {
+    map.getCanvas().style.cursor = '';
+    tooltip.remove();
+});
+</script>
+</body>
+</html>
+""")
+
+# Tiles vetoriais: o MapLibre busca só os tiles visíveis via requisições HTTP Range
+PMTILES_SOURCE = Template("""
+var protocol = new pmtiles.Protocol();
+maplibregl.addProtocol('pmtiles', protocol.tile);
+var archive = new pmtiles.PMTiles(dataUrl);
+protocol.add(archive);
+
+var apcacSource = {type: 'vector', url: 'pmtiles://' + dataUrl};
+var apcacSourceLayer = 'apcac';
+
+function onMapCreated(map) {
+    archive.getHeader().then(function (h) {
+        map.fitBounds([[h.minLon, h.minLat], [h.maxLon, h.maxLat]], {padding: 20, animate: false});
+    });
+}
+""")
+
+# FlatGeobuf: o índice espacial do arquivo permite ler só as feições da área visível
+FLATGEOBUF_SOURCE = Template("""
+var apcacSource = {type: 'geojson', data: {type: 'FeatureCollection', features: []}};
+var apcacSourceLayer = null;
+
+// Arquivo mais simplificado nos zooms baixos, mais detalhado ao aproximar
+var levels = $levels.map(function (level) {
+    return {minZoom: level[0], url: new URL(level[1], document.baseURI).href};
+});
+
+function levelUrl(zoom) {
+    var url = levels[0].url;
+    levels.forEach(function (level) {
+        if (zoom >= level.minZoom) {
+            url = level.url;
+        }
+    });
+    return url;
+}
+
+function onMapCreated(map) {
+    var request = 0;
+
+    async function loadViewport() {
+        var current = ++request;
+        var b = map.getBounds();
+        var rect = {minX: b.getWest(), minY: b.getSouth(), maxX: b.getEast(), maxY: b.getNorth()};
+        var features = [];
+        for await (var feature of flatgeobuf.deserialize(levelUrl(map.getZoom()), rect)) {
+            // Descartar a leitura se o mapa já se moveu de novo
+            if (current !== request) {
+                return;
+            }
+            features.push(feature);
+        }
+        map.getSource('apcac').setData({type: 'FeatureCollection', features: features});
+    }
+
+    map.fitBounds($bounds, {padding: 20, animate: false});
+    map.on('load', function () {
+        loadViewport();
+        map.on('moveend', loadViewport);
+    });
+}
+""")
+
+def layer_parquet_path(layer_name):
+    """Caminho do arquivo GeoParquet com a camada completa"""
+    return f"data/apcac/{layer_name}.parquet"
+
+def list_gpkg_layers():
+    """Lista as camadas APCAC do GPKG"""
+    layers = pyogrio.list_layers(GPKG_PATH)
+    return [
+        name for name, _ in layers
+        if name.startswith('apcac_') and not name.endswith('_bho5k')
+    ]
+
+def source_mtime(*paths):
+    """Data de modificação mais recente entre os arquivos existentes (0.0 se nenhum)"""
+    return max((os.path.getmtime(path) for path in paths if os.path.exists(path)), default=0.0)
+
+@st.cache_resource
 def get_available_layers():
     """Lista as camadas APCAC disponíveis"""
     try:
-        gpkg_path = "data/apcac/apcac.gpkg"
-        conn = sqlite3.connect(gpkg_path)
-        cursor = conn.cursor()
-
-        cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name LIKE 'apcac_%' AND name NOT LIKE '%_bho5k';")
-        apcac_tables = [table[0] for table in cursor.fetchall()]
-        conn.close()
-
-        return apcac_tables
+        # Com as camadas em GeoParquet, listar os arquivos dispensa abrir o GPKG
+        parquet_files = sorted(glob.glob("data/apcac/apcac_*.parquet"))
+        if parquet_files:
+            return [os.path.splitext(os.path.basename(f))[0] for f in parquet_files]
+        return list_gpkg_layers()
     except Exception as e:
         st.error(f"Erro ao listar camadas: {str(e)}")
         return []
 
+def read_statistics_csv():
+    """Lê as estatísticas do arquivo CSV original"""
+    # Parser multithread do Arrow, só com as colunas usadas e já em Arrow
+    return pd.read_csv(STATS_CSV_PATH, sep=';', engine='pyarrow', usecols=list(STATS_DTYPES), dtype=STATS_DTYPES)
+
+@st.cache_data(persist="disk", max_entries=8)
+def load_apcac_statistics(mtime: float = 0.0):
+    """Carrega as estatísticas pré-computadas (Parquet ou CSV; mtime invalida o cache em disco)"""
+    # Erros sobem ao chamador: uma falha não fica gravada no cache em disco
+    if os.path.exists(STATS_PARQUET_PATH):
+        df = pd.read_parquet(STATS_PARQUET_PATH, columns=list(STATS_DTYPES), dtype_backend='pyarrow')
+        return df.astype(STATS_DTYPES)
+    return read_statistics_csv()
+
 @st.cache_data
-def load_apcac_statistics():
-    """Carrega as estatísticas pré-computadas do arquivo CSV"""
+def load_layer_meta():
+    """Carrega o resumo das camadas pré-computado pelo prebuild.py"""
+    if not os.path.exists(LAYER_META_PATH):
+        return None
     try:
-        csv_path = "data/apcac/apcac.csv"
-        df = pd.read_csv(csv_path, sep=';')
-        return df
+        return pd.read_parquet(LAYER_META_PATH)
     except Exception as e:
-        st.error(f"Erro ao carregar estatísticas: {str(e)}")
+        st.error(f"Erro ao carregar resumo das camadas: {str(e)}")
         return None
 
-@st.cache_data
-def parse_qml_style():
-    """Extrai as configurações de estilo do arquivo QML"""
-    try:
-        qml_path = "data/apcac/apcac.qml"
-        tree = ET.parse(qml_path)
-        root = tree.getroot()
-
-        style_map = {}
-
-        # Extrair regras e cores do QML
-        rules = root.findall(".//rule")
-        symbols = root.findall(".//symbol")
+@st.cache_data(persist="disk", show_spinner=False)
+def parse_qml_style(mtime: float = 0.0):
+    """Extrai as configurações de estilo do arquivo QML (mtime invalida o cache em disco)"""
+    # Erros sobem ao chamador: uma falha não fica gravada no cache em disco
+    rules = []
+    symbols = []
 
-        for rule in rules:
-            filter_attr = rule.get('filter', '')
-            label = rule.get('label', '')
-            symbol_name = rule.get('symbol', '')
+    # Percorrer o QML uma única vez, coletando regras e cores dos símbolos
+    for _, elem in ET.iterparse(QML_PATH, events=('end',)):
+        if elem.tag == 'rule':
+            filter_attr = elem.get('filter', '')
 
             # Extrair código APCAC do filtro
-            if 'cd_apcac' in filter_attr:
-                code = filter_attr.split("'")[1] if "'" in filter_attr else ''
+            if 'cd_apcac' in filter_attr and "'" in filter_attr:
+                code = filter_attr.split("'")[1]
                 if code:
-                    style_map[code] = {
-                        'label': label,
-                        'symbol': symbol_name
-                    }
-
-        # Extrair cores dos símbolos
-        color_map = {}
-        for symbol in symbols:
-            symbol_name = symbol.get('name', '')
-            color_elem = symbol.find(".//Option[@name='color']")
-            if color_elem is not None:
-                color_value = color_elem.get('value', '')
-                if color_value:
-                    # Converter de formato QGIS (R,G,B,A) para hex
-                    try:
-                        rgba = [int(x) for x in color_value.split(',')]
-                        hex_color = f"#{rgba[0]:02x}{rgba[1]:02x}{rgba[2]:02x}"
-                        color_map[symbol_name] = hex_color
-                    except:
-                        color_map[symbol_name] = '#808080'  # Cor padrão
-
-        # Combinar estilos e cores
-        for code in style_map:
-            symbol_num = style_map[code]['symbol']
-            if symbol_num in color_map:
-                style_map[code]['color'] = color_map[symbol_num]
-            else:
-                style_map[code]['color'] = '#808080'
-
-        return style_map
+                    rules.append((code, elem.get('label', ''), elem.get('symbol', '')))
+            elem.clear()
+
+        elif elem.tag == 'symbol':
+            color_elem = elem.find(".//Option[@name='color']")
+            if color_elem is not None and color_elem.get('value', ''):
+                symbols.append((elem.get('name', ''), color_elem.get('value')))
+            elem.clear()
+
+    rules_df = pd.DataFrame(rules, columns=['code', 'label', 'symbol'])
+    symbols_df = pd.DataFrame(symbols, columns=['symbol', 'rgba'])
+
+    # Converter de formato QGIS (R,G,B,A[,...]) para hex em lote
+    channels = (
+        symbols_df['rgba'].str.split(',', expand=True)
+        .reindex(columns=range(3))
+        .apply(pd.to_numeric, errors='coerce')
+    )
+    valid = channels.notna().all(axis=1) & channels.isin(range(256)).all(axis=1)
+    rgb = channels.where(valid, 0).to_numpy(dtype=np.int64)
+    packed = pd.Series((rgb[:, 0] << 16) | (rgb[:, 1] << 8) | rgb[:, 2], index=symbols_df.index)
+    symbols_df['color'] = packed.map('#{:06x}'.format).where(valid, '#808080')
+
+    # Combinar estilos e cores (cor padrão para símbolos sem cor)
+    style_table = rules_df.merge(
+        symbols_df.drop_duplicates('symbol', keep='last')[['symbol', 'color']],
+        on='symbol', how='left'
+    )
+    style_table['color'] = style_table['color'].fillna('#808080')
+    style_map = style_table.drop_duplicates('code', keep='last').set_index('code').to_dict('index')
 
-    except Exception as e:
-        st.error(f"Erro ao carregar estilos QML: {str(e)}")
-        return {}
+    return style_map
 
-@st.cache_data
-def load_specific_layer(layer_name):
-    """Carrega uma camada específica do GPKG"""
-    try:
-        gpkg_path = "data/apcac/apcac.gpkg"
-        gdf = gpd.read_file(gpkg_path, layer=layer_name)
-        return gdf
-    except Exception as e:
-        st.error(f"Erro ao carregar camada {layer_name}: {str(e)}")
-        return None
+def to_arrow_codes(gdf):
+    """Armazena os códigos APCAC como strings em Arrow"""
+    if APCAC_COL in gdf:
+        gdf[APCAC_COL] = gdf[APCAC_COL].astype('string[pyarrow]')
+    return gdf
 
-def simplify_geodataframe(gdf, tolerance=0.001):
-    """Simplifica as geometrias do GeoDataFrame para melhor performance"""
+def read_gpkg_layer(layer_name, columns=None):
+    """Lê uma camada do GPKG original (todas as colunas se columns=None)"""
+    # Leitura em bloco via Arrow, apenas com os campos pedidos
+    gdf = pyogrio.read_dataframe(GPKG_PATH, layer=layer_name, columns=columns, use_arrow=True)
+    return to_arrow_codes(gdf)
+
+@st.cache_data(persist="disk", max_entries=8)
+def load_specific_layer(layer_name, columns=None, mtime: float = 0.0):
+    """Carrega uma camada específica (GeoParquet ou GPKG; todas as colunas se columns=None)"""
+    # Erros sobem ao chamador: uma falha não fica gravada no cache em disco
+    parquet_path = layer_parquet_path(layer_name)
+    if os.path.exists(parquet_path):
+        # Leitura colunar, só com os campos pedidos e a geometria
+        gdf = gpd.read_parquet(parquet_path, columns=columns + ['geometry'] if columns else None)
+        return to_arrow_codes(gdf)
+    return read_gpkg_layer(layer_name, columns)
+
+def simplify_geodataframe(gdf, tolerance=100):
+    """Simplifica as geometrias do GeoDataFrame (tolerância em metros) e devolve em WGS84"""
     if gdf is not None and not gdf.empty:
-        # Simplificar geometrias com tolerância baixa (mais detalhada)
-        gdf_simplified = gdf.copy()
-        gdf_simplified['geometry'] = gdf_simplified['geometry'].simplify(tolerance=tolerance, preserve_topology=True)
-        return gdf_simplified
+        # Simplificar geometrias em lote no GEOS, em coordenadas planas (metros)
+        gdf = gdf.to_crs(METRIC_CRS)
+        simplified = shapely.simplify(gdf.geometry.values, tolerance=tolerance, preserve_topology=True)
+        gdf = gdf.assign(geometry=simplified).to_crs(4326)
+        simplified = gdf.geometry.values
+
+        # Corrigir geometrias inválidas, que impediriam o arredondamento das coordenadas
+        invalid = ~shapely.is_valid(simplified)
+        if invalid.any():
+            simplified[invalid] = shapely.make_valid(simplified[invalid])
+
+        # Arredondar as coordenadas a 5 casas decimais (~1 m), encolhendo o GeoJSON e os arquivos gerados
+        snapped = shapely.set_precision(simplified, grid_size=1e-5)
+
+        # Polígonos menores que a grade colapsam em vazios: manter a geometria sem arredondar
+        collapsed = shapely.is_empty(snapped) & ~shapely.is_empty(simplified)
+        snapped[collapsed] = simplified[collapsed]
+        return gdf.assign(geometry=snapped)
+    return gdf
+
+def simplified_path(layer_name, tolerance):
+    """Caminho do arquivo GeoParquet com a camada pré-simplificada"""
+    return f"{SIMPLIFIED_DIR}/{layer_name}_{tolerance}.parquet"
+
+def save_simplified_layer(gdf, path):
+    """Grava a camada simplificada sem expor arquivos incompletos a outras sessões"""
+    tmp_path = None
+    try:
+        os.makedirs(SIMPLIFIED_DIR, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=SIMPLIFIED_DIR, suffix='.tmp')
+        os.close(fd)
+        gdf.to_parquet(tmp_path)
+        os.replace(tmp_path, path)
+    except (OSError, ValueError, pa.ArrowException):
+        # Gravação é só um cache: em caso de falha, seguir com o cache em memória
+        pass
+    finally:
+        # Não deixar o arquivo temporário para trás quando a gravação falha
+        if tmp_path is not None and os.path.exists(tmp_path):
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+
+def load_simplified_layer(layer_name, tolerance=100):
+    """Carrega a camada simplificada do disco ou simplifica e grava para as próximas sessões"""
+    path = simplified_path(layer_name, tolerance)
+
+    # A data de modificação das fontes invalida as cópias persistidas em disco
+    mtime = source_mtime(layer_parquet_path(layer_name), GPKG_PATH)
+    if os.path.exists(path) and os.path.getmtime(path) >= mtime:
+        try:
+            return to_arrow_codes(gpd.read_parquet(path))
+        except Exception as e:
+            st.error(f"Erro ao carregar camada simplificada {path}: {str(e)}")
+
+    gdf = simplify_geodataframe(load_specific_layer(layer_name, POPUP_FIELDS, mtime), tolerance)
+    save_simplified_layer(gdf, path)
     return gdf
 
-def create_folium_map(gdf_simplified, style_map):
+def gdf_to_geojson_bytes(gdf):
+    """Serializa o GeoDataFrame como FeatureCollection GeoJSON em bytes"""
+    # Geometrias convertidas em lote pelo GEOS e embutidas sem reprocessamento
+    geometries = shapely.to_geojson(gdf.geometry.values)
+    properties = gdf.drop(columns=gdf.geometry.name).to_dict(orient='records')
+
+    features = [
+        {
+            'type': 'Feature',
+            'id': str(index),
+            'geometry': orjson.Fragment(geometry) if geometry is not None else None,
+            'properties': props
+        }
+        for index, geometry, props in zip(gdf.index, geometries, properties)
+    ]
+    return orjson.dumps(
+        {'type': 'FeatureCollection', 'features': features},
+        default=lambda value: None if value is pd.NA else str(value),
+        option=orjson.OPT_SERIALIZE_NUMPY
+    )
+
+@st.cache_data(show_spinner=False)
+def load_layer_geojson(layer_name, tolerance=100):
+    """Carrega a camada simplificada já serializada em GeoJSON, com seus limites"""
+    # Independe do estilo: uma mudança no QML não refaz a serialização
+    gdf_simplified = load_simplified_layer(layer_name, tolerance)
+    return gdf_to_geojson_bytes(gdf_simplified), tuple(gdf_simplified.total_bounds)
+
+def create_folium_map(geojson, bounds, style_map):
     """Cria o mapa Folium com os dados APCAC otimizado para performance"""
 
     # Calcular centro do mapa baseado nos dados
-    bounds = gdf_simplified.total_bounds
     center_lat = (bounds[1] + bounds[3]) / 2
     center_lon = (bounds[0] + bounds[2]) / 2
 
@@ -143,46 +462,43 @@ def create_folium_map(gdf_simplified, style_map):
     )
 
     # Adicionar camadas base
-    folium.TileLayer(
-        tiles='https://server.arcgisonline.com/ArcGIS/rest/services/NatGeo_World_Map/MapServer/tile/{z}/{y}/{x}',
-        attr='Esri National Geographic',
-        name='National Geographic',
-        overlay=False,
-        control=True
-    ).add_to(m)
-
-    folium.TileLayer(
-        tiles='https://server.arcgisonline.com/ArcGIS/rest/services/World_Street_Map/MapServer/tile/{z}/{y}/{x}',
-        attr='Esri Standard',
-        name='Street Map',
-        overlay=False,
-        control=True
-    ).add_to(m)
+    for name, tiles, attr in BASEMAPS:
+        folium.TileLayer(
+            tiles=tiles,
+            attr=attr,
+            name=name,
+            overlay=False,
+            control=True
+        ).add_to(m)
 
     # Adicionar dados APCAC se disponíveis
-    apcac_col = 'cd_apcac'
-
-    # Criar função de estilo otimizada
-    def style_function(feature):
-        apcac_code = feature['properties'].get(apcac_col, '')
-        color = style_map[apcac_code]['color']
-
-        return {
-            'fillColor': color,
-            'color': '#333333',
-            'weight': 0.3,  # Linha mais fina para melhor performance
-            'fillOpacity': 0.6,
-            'opacity': 0.8
-        }
-    
-    # Limitar campos no tooltip para melhor performance
-    tooltip_fields = [apcac_col, 'nuareacont', 't', 'slope']
-    tooltip_aliases = ['APCAC:', 'Área (km²)', 'Elevação média (m)', 'Declividade média (%)']
+    apcac_col = APCAC_COL
+
+    # Estilo de cada classe montado uma única vez e compartilhado entre as feições
+    base_style = {
+        'color': '#333333',
+        'weight': 0.3,  # Linha mais fina para melhor performance
+        'fillOpacity': 0.6,
+        'opacity': 0.8
+    }
+    styles = {code: {**base_style, 'fillColor': info['color']} for code, info in style_map.items()}
+    default_style = {**base_style, 'fillColor': '#808080'}
+
+    # Função de estilo executada pelo Leaflet, sem chamadas Python nem objetos novos por feição
+    style_function = folium.JsCode(f"""
+        (function () {{
+            var styles = {json.dumps(styles)};
+            var defaultStyle = {json.dumps(default_style)};
+            return function (feature) {{
+                return styles[feature.properties.{apcac_col}] || defaultStyle;
+            }};
+        }})()
+    """)
 
     # Adicionar camada APCAC com configurações otimizadas
     geojson_layer = folium.GeoJson(
-        gdf_simplified.to_json(),
-        style_function=style_function,
+        orjson.loads(geojson),  # Dicionário é usado direto, sem o json.loads do Folium
+        style=style_function,  # Repassado como opção do L.geoJson
         tooltip=folium.GeoJsonTooltip(
             fields=[apcac_col],
             aliases=['APCAC: '],
@@ -190,8 +506,8 @@ def create_folium_map(gdf_simplified, style_map):
             labels=True
         ),
         popup=folium.GeoJsonPopup(
-            fields=tooltip_fields,
-            aliases=tooltip_aliases
+            fields=POPUP_FIELDS,
+            aliases=POPUP_ALIASES
         ),
         name='APCAC',
         smooth_factor=1.0
@@ -200,56 +516,115 @@ def create_folium_map(gdf_simplified, style_map):
     geojson_layer.add_to(m)
 
     # Ajustar zoom para mostrar todos os dados
-    if hasattr(gdf_simplified, 'total_bounds'):
-        bounds = gdf_simplified.total_bounds
-        m.fit_bounds([[bounds[1], bounds[0]], [bounds[3], bounds[2]]])
+    m.fit_bounds([[bounds[1], bounds[0]], [bounds[3], bounds[2]]])
 
     # Adicionar controle de camadas
     folium.LayerControl().add_to(m)
 
     return m
 
+def tiles_path(layer_name):
+    """Caminho do arquivo PMTiles pré-gerado para a camada"""
+    return f"{TILES_DIR}/{layer_name}.pmtiles"
+
+def fgb_path(layer_name, tolerance):
+    """Caminho do arquivo FlatGeobuf pré-gerado para a camada em uma tolerância"""
+    return f"{FGB_DIR}/{layer_name}_{tolerance}.fgb"
+
+def has_flatgeobuf(layer_name):
+    """Verifica se todos os níveis de FGB_LEVELS foram gerados para a camada"""
+    return all(os.path.exists(fgb_path(layer_name, tolerance)) for _, tolerance in FGB_LEVELS)
+
+def create_maplibre_map(style_map, data_path, library_url, source_script):
+    """Cria o mapa MapLibre GL que lê a camada APCAC de data_path, servido pelo Streamlit"""
+
+    # Expressão 'match' do MapLibre: código APCAC -> cor, cinza como padrão
+    fill_color = '#808080'
+    if style_map:
+        fill_color = ['match', ['get', APCAC_COL]]
+        for code, info in style_map.items():
+            fill_color += [code, info['color']]
+        fill_color.append('#808080')
+
+    return MAPLIBRE_TEMPLATE.substitute(
+        library_url=library_url,
+        basemaps=json.dumps(BASEMAPS),
+        popup_fields=json.dumps(POPUP_FIELDS),
+        popup_aliases=json.dumps(POPUP_ALIASES, ensure_ascii=False),
+        data_url=json.dumps(f"app/{data_path}"),
+        source_script=source_script,
+        fill_color=json.dumps(fill_color)
+    )
+
+def create_pmtiles_map(layer_name, style_map):
+    """Cria o mapa MapLibre GL a partir dos tiles vetoriais (PMTiles) da camada"""
+    return create_maplibre_map(
+        style_map,
+        tiles_path(layer_name),
+        "https://unpkg.com/pmtiles@3.2.1/dist/pmtiles.js",
+        PMTILES_SOURCE.substitute()
+    )
+
+def create_flatgeobuf_map(layer_name, style_map):
+    """Cria o mapa MapLibre GL que lê do FlatGeobuf apenas as feições visíveis, no detalhe do zoom"""
+    levels = [[min_zoom, f"app/{fgb_path(layer_name, tolerance)}"] for min_zoom, tolerance in FGB_LEVELS]
+    path = fgb_path(layer_name, FGB_LEVELS[-1][1])
+    minx, miny, maxx, maxy = pyogrio.read_info(path)['total_bounds']
+    return create_maplibre_map(
+        style_map,
+        path,
+        "https://unpkg.com/flatgeobuf@3/dist/flatgeobuf-geojson.min.js",
+        FLATGEOBUF_SOURCE.substitute(
+            bounds=json.dumps([[minx, miny], [maxx, maxy]]),
+            levels=json.dumps(levels)
+        )
+    )
+
+@st.cache_data
+def build_legend_table(style_map):
+    """Organiza as classes APCAC nas categorias da legenda"""
+    legend = pd.DataFrame.from_dict(style_map, orient='index')
+    labels = legend['label']
+
+    natural = labels.str.contains('Predominância natural', regex=False)
+    anthropic = labels.str.contains('Predominância antrópica', regex=False)
+    high_risk = labels.str.contains('alto risco', regex=False)
+
+    categories = [
+        'Natural - Alto Risco',
+        'Natural - Baixo Risco',
+        'Antrópica - Alto Risco',
+        'Antrópica - Baixo Risco'
+    ]
+    legend['category'] = pd.Categorical(
+        np.select([natural & high_risk, natural, anthropic & high_risk, anthropic], categories, default=None),
+        categories=categories
+    )
+    return legend
+
 def create_legend(style_map):
     """Cria uma legenda para os códigos APCAC"""
 
     st.sidebar.markdown("### 📊 Legenda APCAC")
 
     if style_map:
-        # Organizar por categorias
-        categories = {
-            'Natural - Alto Risco': [],
-            'Natural - Baixo Risco': [],
-            'Antrópica - Alto Risco': [],
-            'Antrópica - Baixo Risco': []
-        }
-
-        for code, info in style_map.items():
-            label = info['label']
-            color = info['color']
-
-            if 'Predominância natural' in label and 'alto risco' in label:
-                categories['Natural - Alto Risco'].append((code, label, color))
-            elif 'Predominância natural' in label:
-                categories['Natural - Baixo Risco'].append((code, label, color))
-            elif 'Predominância antrópica' in label and 'alto risco' in label:
-                categories['Antrópica - Alto Risco'].append((code, label, color))
-            elif 'Predominância antrópica' in label:
-                categories['Antrópica - Baixo Risco'].append((code, label, color))
-
-        for category, items in categories.items():
-            if items:
-                st.sidebar.markdown(f"**{category}:**")
-                for code, label, color in items:
-                    # Criar uma pequena caixa colorida
-                    st.sidebar.markdown(
-                        f'<div style="display: flex; align-items: center; margin: 2px 0;">'
-                        f'<div style="width: 15px; height: 15px; background-color: {color}; '
-                        f'border: 1px solid #000; margin-right: 8px;"></div>'
-                        f'<span style="font-size: 11px;"><b>{code}</b>: {label.split(" - ")[1] if " - " in label else label}</span>'
-                        f'</div>',
-                        unsafe_allow_html=True
-                    )
-                st.sidebar.markdown("")
+        legend = build_legend_table(style_map)
+
+        # Categorias sem classes são omitidas (observed=True)
+        for category, items in legend.groupby('category', observed=True):
+            # Caixas coloridas da categoria montadas juntas e enviadas em um único bloco
+            rows = ''.join(
+                f'<div style="display: flex; align-items: center; margin: 2px 0;">'
+                f'<div style="width: 15px; height: 15px; background-color: {color}; '
+                f'border: 1px solid #000; margin-right: 8px;"></div>'
+                f'<span style="font-size: 11px;"><b>{code}</b>: {label.split(" - ")[1] if " - " in label else label}</span>'
+                f'</div>'
+                for code, label, color in items[['label', 'color']].itertuples()
+            )
+            st.sidebar.markdown(
+                f'**{category}:**\n\n<div style="margin-bottom: 1rem;">{rows}</div>',
+                unsafe_allow_html=True
+            )
     else:
         st.sidebar.markdown("Legenda não disponível")
 
@@ -260,109 +635,72 @@ def create_statistics_charts(df_stats, style_map):
         st.warning("Dados de estatísticas não disponíveis")
         return
 
-    # Preparar dados para gráfico
-    df_chart = df_stats.copy()
-
-    # Adicionar cores baseadas no style_map
-    colors = []
-    for code in df_chart['cd_apcac']:
-        if code in style_map:
-            colors.append(style_map[code]['color'])
-        else:
-            colors.append('#808080')
-
-    df_chart['color'] = colors
-
-    # Criar tabs para diferentes visualizações
-    tab1, tab2, tab3, tab4 = st.tabs(["Área Bioma", "% Bioma", "Área ZHI", "% ZHI"])
-
-    with tab1:
-        st.markdown("**Área no Bioma Cerrado (km²)**")
-        fig1 = px.bar(
-            df_chart,
-            x='cd_apcac',
-            y='bio_area_km2',
-            color='cd_apcac',
-            color_discrete_map={row['cd_apcac']: row['color'] for _, row in df_chart.iterrows()},
-            title="Área das Classes APCAC no Bioma Cerrado"
-        )
-        fig1.update_layout(
-            showlegend=False,
-            xaxis_title="Classe APCAC",
-            yaxis_title="Área (km²)",
-            height=400,
-            xaxis={'categoryorder': 'total descending'}
-        )
-        st.plotly_chart(fig1, use_container_width=True)
-
-    with tab2:
-        st.markdown("**Porcentagem no Bioma Cerrado (%)**")
-        fig2 = px.bar(
-            df_chart,
-            x='cd_apcac',
-            y='bio_area_km2_p',
-            color='cd_apcac',
-            color_discrete_map={row['cd_apcac']: row['color'] for _, row in df_chart.iterrows()},
-            title="Porcentagem das Classes APCAC no Bioma Cerrado"
-        )
-        fig2.update_layout(
-            showlegend=False,
-            xaxis_title="Classe APCAC",
-            yaxis_title="Porcentagem (%)",
-            height=400,
-            xaxis={'categoryorder': 'total descending'}
+    # Preparar dados para gráfico com cores baseadas no style_map
+    code_to_color = {code: info['color'] for code, info in style_map.items()}
+    df_chart = df_stats.assign(color=df_stats['cd_apcac'].map(code_to_color).fillna('#808080'))
+
+    # Métricas exibidas, na ordem dos painéis (2x2)
+    metric_titles = {
+        'bio_area_km2': 'Área no Bioma Cerrado (km²)',
+        'bio_area_km2_p': 'Porcentagem no Bioma Cerrado (%)',
+        'zhi_area_km2': 'Área na Zona de Influência Hidrológica (km²)',
+        'zhi_area_km2_p': 'Porcentagem na Zona de Influência Hidrológica (%)'
+    }
+
+    # Uma única figura 2x2, com uma série de barras por métrica
+    fig = make_subplots(rows=2, cols=2, subplot_titles=list(metric_titles.values()), vertical_spacing=0.15)
+    for i, metric in enumerate(metric_titles):
+        # Classes já em ordem decrescente: o Plotly mantém a ordem dos dados no eixo
+        df_sorted = df_chart.sort_values(metric, ascending=False)
+        fig.add_trace(
+            go.Bar(
+                x=df_sorted['cd_apcac'],
+                y=df_sorted[metric],
+                marker_color=df_sorted['color'],
+                name=metric_titles[metric]
+            ),
+            row=i // 2 + 1,
+            col=i % 2 + 1
         )
-        st.plotly_chart(fig2, use_container_width=True)
-
-    with tab3:
-        st.markdown("**Área na Zona de Influência Hidrológica (km²)**")
-        fig3 = px.bar(
-            df_chart,
-            x='cd_apcac',
-            y='zhi_area_km2',
-            color='cd_apcac',
-            color_discrete_map={row['cd_apcac']: row['color'] for _, row in df_chart.iterrows()},
-            title="Área das Classes APCAC na Zona de Influência Hidrológica"
-        )
-        fig3.update_layout(
-            showlegend=False,
-            xaxis_title="Classe APCAC",
-            yaxis_title="Área (km²)",
-            height=400,
-            xaxis={'categoryorder': 'total descending'}
-        )
-        st.plotly_chart(fig3, use_container_width=True)
-
-    with tab4:
-        st.markdown("**Porcentagem na Zona de Influência Hidrológica (%)**")
-        fig4 = px.bar(
-            df_chart,
-            x='cd_apcac',
-            y='zhi_area_km2_p',
-            color='cd_apcac',
-            color_discrete_map={row['cd_apcac']: row['color'] for _, row in df_chart.iterrows()},
-            title="Porcentagem das Classes APCAC na Zona de Influência Hidrológica"
-        )
-        fig4.update_layout(
-            showlegend=False,
-            xaxis_title="Classe APCAC",
-            yaxis_title="Porcentagem (%)",
-            height=400,
-            xaxis={'categoryorder': 'total descending'}
-        )
-        st.plotly_chart(fig4, use_container_width=True)
+    fig.update_xaxes(title_text='Classe APCAC', row=2)
+    fig.update_layout(
+        showlegend=False,
+        height=800
+    )
+    st.plotly_chart(fig, use_container_width=True)
 
 @st.cache_resource(show_spinner=False)
-def build_map(layer_name: str, style_map: dict, tolerance=0.001):
-    """Cria e cacheia o mapa Folium para uma camada específica"""
-    gdf = load_specific_layer(layer_name)
-    gdf_simplified = simplify_geodataframe(gdf, tolerance)
-    m = create_folium_map(gdf_simplified, style_map)
-    return m._repr_html_()
+def build_map(layer_name: str, style_mtime: float | None, tolerance=100):
+    """Cria e cacheia o mapa para uma camada específica (style_mtime=None: sem estilos)"""
+    # A data de modificação do QML entra na chave do cache no lugar do style_map
+    style_map = parse_qml_style(style_mtime) if style_mtime is not None else {}
+
+    # Com tiles vetoriais ou FlatGeobuf pré-gerados o navegador carrega apenas o que está na tela
+    if os.path.exists(tiles_path(layer_name)):
+        return create_pmtiles_map(layer_name, style_map)
+    if has_flatgeobuf(layer_name):
+        return create_flatgeobuf_map(layer_name, style_map)
+
+    geojson, bounds = load_layer_geojson(layer_name, tolerance)
+    m = create_folium_map(geojson, bounds, style_map)
+    # Página HTML completa: o componente do Streamlit já é um iframe, sem outro iframe com srcdoc escapado
+    return m.get_root().render()
 
 def main():
     """Função principal do dashboard"""
 
+    # Configuração da página
+    st.set_page_config(
+        page_title="APCAC - Cerrado",
+        page_icon="🌳",
+        layout="wide",
+        initial_sidebar_state="expanded"
+    )
+
+    # Título principal
+    st.title("🌳 Áreas Prioritárias para Conservação de Águas do Cerrado")
+    st.markdown("---")
+
     # Sidebar com informações e controles
     st.sidebar.markdown("### ℹ️ Informações do Projeto")
     st.sidebar.markdown("""
@@ -376,8 +714,19 @@ def main():
 
     # Carregar dados
     available_layers = get_available_layers()
-    style_map = parse_qml_style()
-    df_stats = load_apcac_statistics()
+    style_mtime = source_mtime(QML_PATH)
+    try:
+        style_map = parse_qml_style(style_mtime)
+    except Exception as e:
+        st.error(f"Erro ao carregar estilos QML: {str(e)}")
+        # Mapa desenhado sem estilos (cinza), sem reler o QML com erro
+        style_map = {}
+        style_mtime = None
+    try:
+        df_stats = load_apcac_statistics(source_mtime(STATS_PARQUET_PATH, STATS_CSV_PATH))
+    except Exception as e:
+        st.error(f"Erro ao carregar estatísticas: {str(e)}")
+        df_stats = None
 
     # Controles na sidebar
     st.sidebar.markdown("### 🗂️ Configurações")
@@ -407,6 +756,17 @@ def main():
             format_func=lambda x: layer_alias.get(x, x),
             help="Diferentes resoluções de análise das bacias hidrográficas"
         )
+
+        # Resumo da camada lido do arquivo pré-computado
+        layer_meta = load_layer_meta()
+        if layer_meta is not None:
+            meta = layer_meta.loc[layer_meta['layer'] == selected_layer]
+            if not meta.empty:
+                meta = meta.iloc[0]
+                total_area = f"{meta['total_area_km2']:,.0f}".replace(',', '.')
+                st.sidebar.caption(
+                    f"{meta['n_polygons']} bacias · {meta['n_classes']} classes APCAC · {total_area} km²"
+                )
     else:
         st.error("Nenhuma camada APCAC encontrada")
 
@@ -416,14 +776,19 @@ def main():
     # Layout principal
     # Criar e exibir mapa
     with st.spinner('🗺️ Carregando mapa...'):
-        map_html = build_map(selected_layer, style_map)
+        try:
+            map_html = build_map(selected_layer, style_mtime)
+        except Exception as e:
+            st.error(f"Erro ao carregar o mapa: {str(e)}")
+            map_html = None
 
     # Exibir mapa
-    st.components.v1.html(
-        map_html,
-        width=1400,
-        height=700,
-    )
+    if map_html is not None:
+        st.components.v1.html(
+            map_html,
+            width=1400,
+            height=700,
+        )
 
     # Seção de estatísticas
     st.markdown("---")
@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+"""Pré-processamento offline das camadas APCAC usadas pelo mapview.py
+
+Uso (a partir da raiz do repositório):
+    python prebuild.py
+"""
+import os
+import shutil
+import subprocess
+import tempfile
+
+import pandas as pd
+
+from mapview import (
+    APCAC_COL, FGB_DIR, FGB_LEVELS, LAYER_META_PATH, METRIC_CRS, POPUP_FIELDS, SIMPLIFIED_DIR,
+    SIMPLIFY_TOLERANCES, STATS_PARQUET_PATH, TILES_DIR, fgb_path, layer_parquet_path, list_gpkg_layers,
+    read_gpkg_layer, read_statistics_csv, simplified_path, simplify_geodataframe, tiles_path
+)
+
+def build_simplified(layer_name, gdf):
+    """Grava a camada simplificada em cada tolerância de SIMPLIFY_TOLERANCES"""
+    os.makedirs(SIMPLIFIED_DIR, exist_ok=True)
+
+    for tolerance in SIMPLIFY_TOLERANCES:
+        path = simplified_path(layer_name, tolerance)
+        print(f"{layer_name}: gerando {path}")
+        simplify_geodataframe(gdf, tolerance).to_parquet(path)
+
+def build_flatgeobuf(layer_name, gdf):
+    """Grava os FlatGeobuf com índice espacial lidos por partes pelo navegador, um por nível de zoom"""
+    os.makedirs(FGB_DIR, exist_ok=True)
+
+    for _, tolerance in FGB_LEVELS:
+        path = fgb_path(layer_name, tolerance)
+        print(f"{layer_name}: gerando {path}")
+        # simplify_geodataframe já devolve a camada em WGS84
+        simplify_geodataframe(gdf, tolerance).to_file(path, driver="FlatGeobuf", SPATIAL_INDEX="YES")
+
+def layer_summary(layer_name, gdf):
+    """Resume a camada: número de polígonos, de classes e área total"""
+    # Área calculada na projeção policônica do Brasil (SIRGAS 2000, metros)
+    total_area = gdf.to_crs(METRIC_CRS).geometry.area.sum() / 1e6
+    return {
+        'layer': layer_name,
+        'n_polygons': len(gdf),
+        'n_classes': gdf[APCAC_COL].nunique(),
+        'total_area_km2': total_area
+    }
+
+def build_tiles(layer_name, gdf):
+    """Gera o PMTiles da camada com o tippecanoe"""
+    os.makedirs(TILES_DIR, exist_ok=True)
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        # O tippecanoe espera WGS84 e não lê GPKG: exportar só os campos do popup
+        source = os.path.join(tmp_dir, f"{layer_name}.fgb")
+        gdf[POPUP_FIELDS + ['geometry']].to_crs(4326).to_file(source, driver="FlatGeobuf")
+
+        # Nos zooms baixos, fundir os polígonos mais densos aos vizinhos: tiles leves sem buracos na cobertura
+        subprocess.run(
+            ['tippecanoe', '-zg', '--coalesce-densest-as-needed', '--force', '-l', 'apcac',
+             '-o', tiles_path(layer_name), source],
+            check=True
+        )
+
+def main():
+    """Processa todas as camadas APCAC do geopackage"""
+    has_tippecanoe = shutil.which('tippecanoe') is not None
+    if not has_tippecanoe:
+        print("tippecanoe não encontrado no PATH: tiles vetoriais não serão gerados")
+
+    print(f"Gravando {STATS_PARQUET_PATH}")
+    read_statistics_csv().to_parquet(STATS_PARQUET_PATH, index=False)
+
+    summaries = []
+    for layer_name in list_gpkg_layers():
+        gdf = read_gpkg_layer(layer_name)
+        if APCAC_COL not in gdf:
+            print(f"{layer_name}: camada ignorada")
+            continue
+
+        # Camada completa em GeoParquet; o restante usa só os campos do popup
+        print(f"{layer_name}: gerando {layer_parquet_path(layer_name)}")
+        gdf.to_parquet(layer_parquet_path(layer_name))
+        gdf = gdf[POPUP_FIELDS + ['geometry']]
+
+        build_simplified(layer_name, gdf)
+        build_flatgeobuf(layer_name, gdf)
+        summaries.append(layer_summary(layer_name, gdf))
+
+        if has_tippecanoe:
+            print(f"{layer_name}: gerando {tiles_path(layer_name)}")
+            build_tiles(layer_name, gdf)
+
+    print(f"Gravando {LAYER_META_PATH}")
+    pd.DataFrame(summaries).to_parquet(LAYER_META_PATH, index=False)
+
+if __name__ == "__main__":
+    main()